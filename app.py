@@ -2,9 +2,14 @@ from flask import Flask, request, jsonify, render_template, session, redirect, u
 from embeddings import EmbeddingModel
 from indexer import FaissIndexer
 from search import SemanticSearch
+from llm_client import LLMClient
+from session_store import ChatSessionStore
+from config import SESSION_DB_PATH, SESSION_MAX_CACHED, CHAT_KEEP_FULL_TURNS, CHAT_PAGE_SIZE
+from config import NUM_SHARDS, SHARD_BY
 from utils import load_text_file, chunk_text,load_pdf_file
-import math
+import atexit
 import time
+import uuid
 import os
 
 
@@ -13,15 +18,36 @@ import os
 app = Flask(__name__)
 app.secret_key = "vectorforge_secret_key"
 
+# Chat history lives server-side; the cookie only carries the session ID
+chat_store = ChatSessionStore(
+    max_sessions=SESSION_MAX_CACHED,
+    db_path=SESSION_DB_PATH or None,
+    keep_full_turns=CHAT_KEEP_FULL_TURNS
+)
+
+def get_session_id():
+    if "sid" not in session:
+        session["sid"] = uuid.uuid4().hex
+    return session["sid"]
+
 @app.route("/", methods=["GET"])
 def landing():
     return render_template("landing.html")
 
 @app.route("/app", methods=["GET"])
 def home():
+    page = request.args.get("page", type=int)
+    chat_history, page, total_pages = chat_store.page(
+        get_session_id(),
+        page=page,
+        page_size=CHAT_PAGE_SIZE
+    )
+
     return render_template(
         "index.html",
-        chat_history=session.get("chat_history", []),
+        chat_history=chat_history,
+        page=page,
+        total_pages=total_pages,
         uploaded_files=search_engine.uploaded_files,
         total_chunks=len(search_engine.documents),
         total_files=len(search_engine.uploaded_files),
@@ -50,17 +76,14 @@ def web_query():
     )
 
     # --Chat Session Init
-    if "chat_history" not in session:
-        session["chat_history"] = []
+    session_id = get_session_id()
 
     # No Documents Guard
     if not search_engine.documents:
-        session["chat_history"].append({
+        chat_store.append(session_id, {
             "role": "user",
             "content": question
-        })
-
-        session["chat_history"].append({
+        }, {
             "role": "assistant",
             "content": "No documents uploaded. Please upload a file first.",
             "similarity": 0,
@@ -70,7 +93,6 @@ def web_query():
             "total_time": 0
         })
 
-        session.modified = True
         return redirect(url_for("home"))
 
     total_start = time.perf_counter()
@@ -104,12 +126,10 @@ def web_query():
         answer = "Answer not found in documents."
 
     # Saving Convos
-    session["chat_history"].append({
+    chat_store.append(session_id, {
         "role": "user",
         "content": question
-    })
-
-    session["chat_history"].append({
+    }, {
         "role": "assistant",
         "content": answer,
         "similarity": top_similarity,
@@ -126,8 +146,6 @@ def web_query():
         "total_time": total_time
     })
 
-    session.modified = True
-
     return redirect(url_for("home"))
 
 # Initialization of empty seach engine at startup
@@ -141,7 +159,18 @@ dimension = embedding_model.dimension
 nlist = 1
 indexer = FaissIndexer(dimension, nlist=nlist)
 
-search_engine = SemanticSearch(embedding_model, indexer)
+# One pooled LLM client for the lifetime of the process
+llm_client = LLMClient()
+atexit.register(llm_client.close)
+
+search_engine = SemanticSearch(
+    embedding_model,
+    indexer,
+    llm_client=llm_client,
+    micro_batching=True,
+    num_shards=NUM_SHARDS,
+    shard_by=SHARD_BY
+)
 
 print("System ready. No documents indexed.")
 
@@ -151,6 +180,16 @@ print("System ready. No documents indexed.")
 def health():
     return jsonify({"status": "running"})
 
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        "num_chunks_indexed": len(search_engine.documents),
+        "total_vectors": search_engine.total_vectors(),
+        "total_files": len(search_engine.uploaded_files),
+        "dedup": search_engine.dedup_stats(),
+        "batching": search_engine.batching_stats()
+    })
+
  
 # Query Endpoint
 
@@ -205,7 +244,7 @@ def upload():
 
     chunks = chunk_text(text, chunk_size=80, overlap=20)
 
-    # Adds to the index dynamically
+    # Adds to the index dynamically (a re-upload of the same filename only reindexes changed chunks)
     search_engine.add_documents(chunks, source_name=file.filename)
     
     # clearing cache
@@ -222,14 +261,9 @@ def upload():
 
 @app.route("/clear", methods=["POST"])
 def clear():
-    search_engine.documents = []
-    search_engine.doc_metadata = []
-    search_engine.uploaded_files = {}
-
-    # Reset FAISS when the convo is cleared
-    dimension = embedding_model.dimension
-    nlist = max(1, int(math.sqrt(len(search_engine.documents) or 1)))
-    search_engine.indexer = FaissIndexer(dimension, nlist=nlist)
+    # Reset documents, dedup state and FAISS when the convo is cleared
+    search_engine.clear()
+    search_engine.answer_cache = {}
 
     return render_template(
         "index.html",
@@ -240,7 +274,7 @@ def clear():
 
 @app.route("/clear_chat", methods=["POST"])
 def clear_chat():
-    session.pop("chat_history", None)
+    chat_store.clear(get_session_id())
     return redirect(url_for("home"))
 
 @app.route("/delete_file", methods=["POST"])
@@ -250,28 +284,9 @@ def delete_file():
     if filename not in search_engine.uploaded_files:
         return redirect(url_for("home"))
 
-    # Remove file entry
-    del search_engine.uploaded_files[filename]
-
-    # Remove associated documents and metadata
-    remaining_docs = []
-    remaining_meta = []
-
-    for doc, meta in zip(search_engine.documents, search_engine.doc_metadata):
-        if meta["source"] != filename:
-            remaining_docs.append(doc)
-            remaining_meta.append(meta)
-
-    search_engine.documents = remaining_docs
-    search_engine.doc_metadata = remaining_meta
-
-    # Rebuild FAISS index
-    dimension = embedding_model.dimension
-    nlist = max(1, int(math.sqrt(len(search_engine.documents) or 1)))
-    search_engine.indexer = FaissIndexer(dimension, nlist=nlist)
-
-    if search_engine.documents:
-        search_engine.indexer.add(search_engine.embedding_model.encode(search_engine.documents))
+    # Remove file entry, its chunks, and rebuild FAISS / BM25 from what remains
+    search_engine.remove_source(filename)
+    search_engine.answer_cache = {}
 
     return redirect(url_for("home"))
 
@@ -0,0 +1,100 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Collects calls from concurrent requests for a few milliseconds and runs
+    them as one batched call.
+
+    batch_fn takes a list of items and returns something sliceable with one
+    entry per item (a numpy array from encode / predict works as-is).
+    """
+
+    def __init__(self, batch_fn, max_batch_size=32, max_wait_ms=5, name="micro-batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+
+        self._queue = queue.Queue()
+
+        # Stats
+        self.batches_run = 0
+        self.items_processed = 0
+
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, items):
+        """Blocks until the batch containing `items` has run, returns their slice."""
+        if not items:
+            return self.batch_fn([])
+
+        if not self._worker.is_alive():
+            raise RuntimeError(f"{self._worker.name} worker is not running")
+
+        future = Future()
+        self._queue.put((list(items), future))
+        return future.result()
+
+    def _collect(self):
+        # Block for the first request, then wait at most max_wait for company
+        pending = [self._queue.get()]
+        size = len(pending[0][0])
+        deadline = time.perf_counter() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+
+            pending.append(request)
+            size += len(request[0])
+
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+
+            batch = []
+            for items, _ in pending:
+                batch.extend(items)
+
+            # Any failure is handed to the callers; the worker itself must never die,
+            # or every later submit() would wait forever
+            try:
+                results = self.batch_fn(batch)
+
+                if len(results) != len(batch):
+                    raise ValueError(
+                        f"{self._worker.name}: batch_fn returned {len(results)} results for {len(batch)} items"
+                    )
+
+                self.batches_run += 1
+                self.items_processed += len(batch)
+
+                # Hand each caller back the rows that belong to it
+                offset = 0
+                for items, future in pending:
+                    future.set_result(results[offset:offset + len(items)])
+                    offset += len(items)
+
+            except BaseException as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def stats(self):
+        return {
+            "batches_run": self.batches_run,
+            "items_processed": self.items_processed,
+            "avg_batch_size": round(self.items_processed / self.batches_run, 2) if self.batches_run else 0
+        }
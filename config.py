@@ -7,4 +7,34 @@ LLM_MODE = os.getenv("LLM_MODE", "local")  # "local" or "api"
 
 # For API mode
 API_KEY = os.getenv("API_KEY", "")
-API_MODEL = os.getenv("API_MODEL", "llama3-8b-8192")
\ No newline at end of file
+API_MODEL = os.getenv("API_MODEL", "llama3-8b-8192")
+API_BASE_URL = os.getenv("API_BASE_URL", "")  # empty = Groq default, set to point at a stand-in server
+
+# For local mode
+LOCAL_MODEL = os.getenv("LOCAL_MODEL", "llama3")
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+
+# LLM client pool
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # seconds per request
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))  # generations in flight at once
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "10"))  # keep-alive HTTP connections
+
+
+# Cross-request micro-batching of query encodes / reranker predicts
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+# Ingest-time duplicate chunk detection
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))  # min estimated Jaccard for a near-duplicate
+
+# Server-side chat sessions
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "")  # empty = in-process only, else SQLite file
+SESSION_MAX_CACHED = int(os.getenv("SESSION_MAX_CACHED", "1000"))  # sessions kept in the LRU
+CHAT_KEEP_FULL_TURNS = int(os.getenv("CHAT_KEEP_FULL_TURNS", "10"))  # older turns lose their sources
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "20"))  # messages rendered per page
+
+# Sharded scatter-gather search (1 = single in-process index)
+NUM_SHARDS = int(os.getenv("NUM_SHARDS", "1"))
+SHARD_BY = os.getenv("SHARD_BY", "source")  # "source" or "hash"
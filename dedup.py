@@ -0,0 +1,130 @@
+import hashlib
+import re
+import zlib
+import numpy as np
+
+
+# Mersenne prime for the universal hash family used by MinHash
+_PRIME = (1 << 31) - 1
+
+
+def normalize_text(text):
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def content_hash(text):
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class ChunkDeduplicator:
+    """
+    Ingest-time duplicate detection for chunks.
+
+    Stage 1 — exact: SHA-1 of the normalized chunk text.
+    Stage 2 — near: MinHash over word shingles, bucketed with LSH banding,
+    confirmed by estimated Jaccard similarity >= threshold.
+
+    Maps every detected duplicate to the chunk_id of its canonical chunk.
+    """
+
+    def __init__(self, threshold=0.85, num_perm=64, bands=8, shingle_size=3, seed=42):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+        self.reset()
+
+    def reset(self):
+        self._exact = {}        # content hash -> chunk_id
+        self._signatures = {}   # chunk_id -> MinHash signature
+        self._buckets = {}      # (band, band hash) -> [chunk_id]
+        self._last_signature = None
+
+    def _signature(self, text):
+        words = normalize_text(text).split()
+        n = self.shingle_size
+
+        if len(words) <= n:
+            shingles = {" ".join(words)}
+        else:
+            shingles = {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+        hashes = np.array(
+            [zlib.crc32(s.encode("utf-8")) & _PRIME for s in shingles],
+            dtype=np.uint64
+        )
+
+        # (a * x + b) mod p for every permutation, minimum over shingles
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME
+        return permuted.min(axis=1)
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            yield (band, rows.tobytes())
+
+    def find(self, text):
+        """Returns (canonical chunk_id, "exact" | "near") or (None, None)."""
+        canonical = self._exact.get(content_hash(text))
+        if canonical is not None:
+            return canonical, "exact"
+
+        signature = self._signature(text)
+        self._last_signature = (text, signature)  # reused by add() on a miss
+        candidates = set()
+
+        for key in self._band_keys(signature):
+            candidates.update(self._buckets.get(key, []))
+
+        best_id, best_similarity = None, 0
+        for chunk_id in candidates:
+            similarity = float(np.mean(self._signatures[chunk_id] == signature))
+            if similarity > best_similarity:
+                best_id, best_similarity = chunk_id, similarity
+
+        if best_id is not None and best_similarity >= self.threshold:
+            return best_id, "near"
+
+        return None, None
+
+    def add(self, text, chunk_id):
+        """Registers a stored (canonical) chunk."""
+        self._exact.setdefault(content_hash(text), chunk_id)
+
+        if self._last_signature is not None and self._last_signature[0] == text:
+            signature = self._last_signature[1]
+        else:
+            signature = self._signature(text)
+
+        self._signatures[chunk_id] = signature
+
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(chunk_id)
+
+    def remap(self, new_ids):
+        """Renumbers registered chunks after compaction; chunk_ids missing from new_ids are dropped."""
+        signatures = self._signatures
+        exact = self._exact
+
+        self.reset()
+
+        for content, chunk_id in exact.items():
+            if chunk_id in new_ids:
+                self._exact[content] = new_ids[chunk_id]
+
+        for chunk_id, signature in signatures.items():
+            if chunk_id not in new_ids:
+                continue
+
+            self._signatures[new_ids[chunk_id]] = signature
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, []).append(new_ids[chunk_id])
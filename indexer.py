@@ -15,6 +15,9 @@ class FaissIndexer:
             faiss.METRIC_INNER_PRODUCT
         )
 
+        # id -> list position map, so stored vectors can be read back (reconstruct)
+        self.index.make_direct_map()
+
     def add(self, vectors):
         # IMPORTANTT: IVF needs to be trained before adding
         if not self.index.is_trained:
@@ -28,5 +31,12 @@ class FaissIndexer:
         distances, indices = self.index.search(query_vector, top_k)
         return distances, indices
 
+    def reconstruct_all(self):
+        # IVFFlat keeps the raw vectors, so this returns exactly what was added, in id order
+        if self.index.ntotal == 0:
+            return np.zeros((0, self.dimension), dtype="float32")
+
+        return self.index.reconstruct_n(0, self.index.ntotal)
+
     def total_vectors(self):
         return self.index.ntotal
\ No newline at end of file
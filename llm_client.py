@@ -0,0 +1,197 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import httpx
+import ollama
+from config import (
+    LLM_MODE,
+    API_KEY,
+    API_MODEL,
+    API_BASE_URL,
+    LOCAL_MODEL,
+    OLLAMA_HOST,
+    LLM_TIMEOUT,
+    LLM_MAX_RETRIES,
+    LLM_MAX_CONCURRENCY,
+    LLM_POOL_SIZE,
+)
+
+
+class LLMClient:
+    """
+    Long-lived LLM client shared by every request.
+
+    - One underlying HTTP client per process (keep-alive connection pool)
+    - Bounded number of generations in flight at once
+    - Timeouts and retries on transient failures
+    - Single-flight: identical prompts issued concurrently share one generation
+    """
+
+    def __init__(
+        self,
+        mode=LLM_MODE,
+        timeout=LLM_TIMEOUT,
+        max_retries=LLM_MAX_RETRIES,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        pool_size=LLM_POOL_SIZE,
+        local_host=OLLAMA_HOST,
+        local_model=LOCAL_MODEL,
+        api_key=API_KEY,
+        api_model=API_MODEL,
+        api_base_url=API_BASE_URL,
+    ):
+        self.mode = mode
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.local_host = local_host
+        self.local_model = local_model
+        self.api_key = api_key
+        self.api_model = api_model
+        self.api_base_url = api_base_url or None
+
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(max(1, max_concurrency))
+
+        # prompt key -> Future of the generation currently running for it
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+        self.coalesced_requests = 0
+
+    @property
+    def model(self):
+        return self.local_model if self.mode == "local" else self.api_model
+
+    def _limits(self):
+        return httpx.Limits(
+            max_connections=self.pool_size,
+            max_keepalive_connections=self.pool_size
+        )
+
+    def _build_client(self):
+        if self.mode == "local":
+            # kwargs are forwarded to the underlying httpx.Client
+            return ollama.Client(
+                host=self.local_host,
+                timeout=self.timeout,
+                limits=self._limits()
+            )
+
+        if self.mode == "api":
+            from groq import Groq
+
+            # Groq handles its own retries with backoff
+            return Groq(
+                api_key=self.api_key,
+                base_url=self.api_base_url,
+                timeout=self.timeout,
+                max_retries=self.max_retries,
+                http_client=httpx.Client(
+                    timeout=self.timeout,
+                    limits=self._limits()
+                )
+            )
+
+        raise ValueError(f"Unknown LLM_MODE: {self.mode}")
+
+    @property
+    def client(self):
+        # Built lazily so scripts that never generate don't need a key / server
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._build_client()
+        return self._client
+
+    def chat(self, prompt):
+        key = (self.mode, self.model, prompt)
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+
+            if future is not None:
+                self.coalesced_requests += 1
+                leader = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                leader = True
+
+        # Followers wait for the leader's result (or exception); the leader's path
+        # is bounded end to end (slot wait + generation), so it always resolves
+        if not leader:
+            return future.result()
+
+        try:
+            # Same bound for waiting on a free slot as for a generation itself
+            if not self._semaphore.acquire(timeout=self._max_generation_time()):
+                raise TimeoutError(
+                    f"No free LLM slot within {self._max_generation_time():.1f}s "
+                    f"(LLM_MAX_CONCURRENCY generations already running)"
+                )
+
+            try:
+                answer = self._generate(prompt)
+            finally:
+                self._semaphore.release()
+
+            future.set_result(answer)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+        return answer
+
+    def _max_generation_time(self):
+        backoff = sum(0.5 * (2 ** attempt) for attempt in range(self.max_retries))
+        return self.timeout * (self.max_retries + 1) + backoff
+
+    def _generate(self, prompt):
+        messages = [{"role": "user", "content": prompt}]
+
+        if self.mode == "api":
+            response = self.client.chat.completions.create(
+                model=self.api_model,
+                messages=messages,
+                temperature=0
+            )
+            return response.choices[0].message.content
+
+        # ollama has no built-in retry, so transient failures are retried here
+        attempt = 0
+        while True:
+            try:
+                response = self.client.chat(
+                    model=self.local_model,
+                    messages=messages,
+                    options={"temperature": 0}
+                )
+                return response["message"]["content"]
+
+            except (httpx.TransportError, ConnectionError, ollama.ResponseError) as e:
+                retryable = not isinstance(e, ollama.ResponseError) or e.status_code >= 500
+
+                if not retryable or attempt >= self.max_retries:
+                    raise
+
+                time.sleep(0.5 * (2 ** attempt))
+                attempt += 1
+
+    def close(self):
+        with self._client_lock:
+            client, self._client = self._client, None
+
+        if client is None:
+            return
+
+        # Groq exposes close(); ollama.Client wraps its httpx.Client in _client
+        if hasattr(client, "close"):
+            client.close()
+        else:
+            client._client.close()
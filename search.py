@@ -1,84 +1,369 @@
-import ollama
+import threading
 from rank_bm25 import BM25Okapi
 from sentence_transformers import CrossEncoder
-from config import LLM_MODE, API_KEY, API_MODEL
+from config import LLM_MODE, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, DEDUP_ENABLED, DEDUP_THRESHOLD
+from indexer import FaissIndexer
+from llm_client import LLMClient
+from batching import MicroBatcher
+from dedup import ChunkDeduplicator, content_hash
+from sharding import ShardCoordinator
 
 
 class SemanticSearch:
-    def __init__(self, embedding_model, indexer):
+    def __init__(self, embedding_model, indexer, llm_client=None, micro_batching=False,
+                 num_shards=1, shard_by="source"):
         self.embedding_model = embedding_model
         self.indexer = indexer
+
+        # Shared across requests so connections are pooled and duplicate prompts coalesced
+        self.llm_client = llm_client or LLMClient()
+
         self.documents = []
         self.doc_metadata = []
         self.uploaded_files = {}
         self.answer_cache = {}
         self.tokenized_docs = []
         self.bm25 = None
+
+        # Compaction renumbers chunk ids by replacing documents / doc_metadata (ingest
+        # only appends), so writers are excluded while a query fetches candidates and
+        # takes its reference to those lists
+        self._index_lock = threading.RLock()
+
+        # With more than one shard, dense + sparse indexes live in worker processes
+        # and `indexer` / `bm25` here stay empty
+        self.shards = None
+        if num_shards > 1:
+            self.shards = ShardCoordinator(num_shards, indexer.dimension, partition=shard_by)
+
+        # Near-duplicate chunks are linked to a canonical chunk instead of being indexed again
+        self.deduplicator = ChunkDeduplicator(threshold=DEDUP_THRESHOLD) if DEDUP_ENABLED else None
+        self.duplicate_links = []
         
         if LLM_MODE == "local":
             self.reranker = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
         else:
             self.reranker = None
 
+        # Under concurrent traffic, batch single-query encodes / rerank calls across requests
+        self.query_batcher = None
+        self.rerank_batcher = None
+
+        if micro_batching:
+            self.query_batcher = MicroBatcher(
+                self.embedding_model.encode,
+                max_batch_size=BATCH_MAX_SIZE,
+                max_wait_ms=BATCH_MAX_WAIT_MS,
+                name="query-encode-batcher"
+            )
+
+            if self.reranker is not None:
+                self.rerank_batcher = MicroBatcher(
+                    self.reranker.predict,
+                    max_batch_size=BATCH_MAX_SIZE,
+                    max_wait_ms=BATCH_MAX_WAIT_MS,
+                    name="rerank-batcher"
+                )
+
     def add_documents(self, documents, source_name=None):
+        with self._index_lock:
+            return self._add_documents(documents, source_name)
+
+    def _add_documents(self, documents, source_name):
+
+        # Re-upload of a known file: only reindex what changed
+        if source_name and source_name in self.uploaded_files:
+            return self._update_source(documents, source_name)
+
+        added, linked = self._ingest(documents, [source_name] * len(documents))
+
+        if source_name:
+            self.uploaded_files[source_name] = len(documents)
+
+        return {"added": added, "linked": linked, "removed": 0, "unchanged": 0}
+
+    def update_source(self, documents, source_name):
+        with self._index_lock:
+            return self._update_source(documents, source_name)
+
+    def _update_source(self, documents, source_name):
+
+        # Stored chunks and duplicate links currently owned by this source, keyed by content hash
+        old_chunks = {}
+        for i, meta in enumerate(self.doc_metadata):
+            if meta["source"] == source_name:
+                old_chunks.setdefault(content_hash(self.documents[i]), []).append(("chunk", i))
+
+        for i, link in enumerate(self.duplicate_links):
+            if link["source"] == source_name:
+                old_chunks.setdefault(content_hash(link["text"]), []).append(("link", i))
+
+        # Diff: a new chunk whose hash matches an old one keeps it, everything else goes through ingest
+        changed = []
+        unchanged = 0
+
+        for doc in documents:
+            matches = old_chunks.get(content_hash(doc))
+
+            if matches:
+                matches.pop()
+                unchanged += 1
+            else:
+                changed.append(doc)
+
+        vanished = [entry for entries in old_chunks.values() for entry in entries]
+        removed_chunks = {i for kind, i in vanished if kind == "chunk"}
+        removed_links = {i for kind, i in vanished if kind == "link"}
+
+        if removed_chunks or removed_links:
+            keep = [i for i in range(len(self.documents)) if i not in removed_chunks]
+            self.duplicate_links = [
+                link for i, link in enumerate(self.duplicate_links)
+                if i not in removed_links
+            ]
+            self._compact(keep)
+
+        added, linked = self._ingest(changed, [source_name] * len(changed))
+
+        self.uploaded_files[source_name] = len(documents)
+
+        return {"added": added, "linked": linked, "removed": len(vanished), "unchanged": unchanged}
+
+    def _ingest(self, documents, sources):
+        """Returns (chunks embedded and stored, chunks linked to an existing duplicate)."""
 
         start_index = len(self.documents)
+        new_docs = []
+        new_sources = []
 
-        self.documents.extend(documents)
-        
-        # Update BM25
-        self.tokenized_docs = [doc.split() for doc in self.documents]
-        self.bm25 = BM25Okapi(self.tokenized_docs)
+        # Dedup stage: duplicates are linked to their canonical chunk instead of being embedded again
+        for doc, source in zip(documents, sources):
+            canonical, kind = (None, None)
+
+            if self.deduplicator is not None:
+                canonical, kind = self.deduplicator.find(doc)
+
+            if canonical is not None:
+                self.duplicate_links.append({
+                    "source": source,
+                    "canonical_id": canonical,
+                    "match": kind,
+                    "text": doc
+                })
+                continue
+
+            if self.deduplicator is not None:
+                self.deduplicator.add(doc, start_index + len(new_docs))
+
+            new_docs.append(doc)
+            new_sources.append(source)
 
-        embeddings = self.embedding_model.encode(documents)
-        self.indexer.add(embeddings)
+        linked = len(documents) - len(new_docs)
 
-        for i in range(len(documents)):
+        if not new_docs:
+            return 0, linked
+
+        self.documents.extend(new_docs)
+
+        embeddings = self.embedding_model.encode(new_docs)
+
+        if self.shards is not None:
+            # Each shard keeps its own dense + sparse index for its partition
+            self.shards.add(
+                list(range(start_index, start_index + len(new_docs))),
+                new_docs,
+                new_sources,
+                embeddings
+            )
+        else:
+            # Update BM25
+            self._rebuild_bm25()
+            self.indexer.add(embeddings)
+
+        for i, source in enumerate(new_sources):
             self.doc_metadata.append({
-                "source": source_name,
+                "source": source,
                 "chunk_index": start_index + i
             })
 
-      
-        if source_name:
-            if source_name in self.uploaded_files:
-                self.uploaded_files[source_name] += len(documents)
+        return len(new_docs), linked
+
+    def remove_source(self, source_name):
+        with self._index_lock:
+            self._remove_source(source_name)
+
+    def _remove_source(self, source_name):
+
+        self.uploaded_files.pop(source_name, None)
+
+        keep = [
+            i for i, meta in enumerate(self.doc_metadata)
+            if meta["source"] != source_name
+        ]
+        self.duplicate_links = [
+            link for link in self.duplicate_links
+            if link["source"] != source_name
+        ]
+
+        self._compact(keep)
+
+    def clear(self):
+        with self._index_lock:
+            self.uploaded_files = {}
+            self.duplicate_links = []
+            self._compact([])
+
+    def _compact(self, keep):
+        """Keeps only the stored chunks at positions `keep` and rebuilds the indexes from the indexed vectors."""
+
+        new_ids = {old: new for new, old in enumerate(keep)}
+
+        self.documents = [self.documents[i] for i in keep]
+        self.doc_metadata = [
+            {**self.doc_metadata[old], "chunk_index": new}
+            for new, old in enumerate(keep)
+        ]
+        # Duplicates whose canonical chunk was removed get promoted back into the index below
+        links = []
+        orphans = []
+
+        for link in self.duplicate_links:
+            if link["canonical_id"] in new_ids:
+                links.append({**link, "canonical_id": new_ids[link["canonical_id"]]})
             else:
-                self.uploaded_files[source_name] = len(documents)
+                orphans.append(link)
+
+        self.duplicate_links = links
+
+        if self.deduplicator is not None:
+            self.deduplicator.remap(new_ids)
+
+        if self.shards is not None:
+            # Shards drop removed chunks and rebuild from the vectors they hold
+            self.shards.remap(new_ids)
+        else:
+            self._rebuild_bm25()
+
+            # Vectors come back out of FAISS, so nothing is re-encoded and no second copy is kept
+            embeddings = self.indexer.reconstruct_all()[keep]
+
+            # Reset FAISS with the same IVF size, so an edit or delete doesn't change
+            # search quality for the whole corpus (capped: IVF needs >= nlist points to train)
+            nlist = max(1, min(self.indexer.nlist, len(self.documents)))
+            self.indexer = FaissIndexer(self.indexer.dimension, nlist=nlist)
+
+            if self.documents:
+                self.indexer.add(embeddings)
+
+        if orphans:
+            self._ingest(
+                [link["text"] for link in orphans],
+                [link["source"] for link in orphans]
+            )
+
+    def _rebuild_bm25(self):
+        self.tokenized_docs = [doc.split() for doc in self.documents]
+        self.bm25 = BM25Okapi(self.tokenized_docs) if self.tokenized_docs else None
+
+    def dedup_stats(self):
+        if self.deduplicator is None:
+            return None
+
+        stored = len(self.documents)
+        exact = sum(1 for link in self.duplicate_links if link["match"] == "exact")
+        near = len(self.duplicate_links) - exact
+        seen = stored + exact + near
+
+        return {
+            "chunks_seen": seen,
+            "chunks_stored": stored,
+            "exact_duplicates": exact,
+            "near_duplicates": near,
+            "saved_ratio": round((exact + near) / seen, 4) if seen else 0
+        }
+
+    def batching_stats(self):
+        return {
+            "query_encode": self.query_batcher.stats() if self.query_batcher is not None else None,
+            "rerank": self.rerank_batcher.stats() if self.rerank_batcher is not None else None
+        }
+
+    def encode_query(self, text):
+        if self.query_batcher is not None:
+            return self.query_batcher.submit([text])
+
+        return self.embedding_model.encode([text])
+
+    def rerank(self, pairs):
+        if self.rerank_batcher is not None:
+            return self.rerank_batcher.submit(pairs)
+
+        return self.reranker.predict(pairs)
                 
+    def _retrieve(self, query_vector, text, top_k):
+        """
+        First-stage candidates as (dense, sparse) lists of (chunk_id, score).
+        Either side is skipped when its query (vector / text) is None.
+        Callers hold _index_lock and resolve ids against the lists seen under it.
+        """
+        if self.shards is not None:
+            # Scatter to every shard in parallel, gather merged per-shard top-k
+            return self.shards.search(query_vector, text, top_k)
+
+        dense = []
+        if query_vector is not None:
+            distances, indices = self.indexer.search(query_vector, top_k)
+
+            for rank, idx in enumerate(indices[0]):
+                # FAISS pads with -1 when fewer than top_k vectors are indexed
+                if idx >= 0:
+                    dense.append((int(idx), float(distances[0][rank])))
+
+        sparse = []
+        if text is not None and self.bm25 is not None:
+            tokenized_query = text.split()
+            scores = self.bm25.get_scores(tokenized_query)
+
+            top_sparse_indices = sorted(
+                range(len(scores)),
+                key=lambda i: scores[i],
+                reverse=True
+            )[:top_k]
+
+            sparse = [(int(idx), scores[idx]) for idx in top_sparse_indices]
+
+        return dense, sparse
+
+    def total_vectors(self):
+        if self.shards is not None:
+            return self.shards.total_vectors()
+
+        return self.indexer.total_vectors()
+
     def query(self, text, top_k=3):
 
         # Dense Retrieval
         dense_candidate_k = top_k * 5
-        query_vector = self.embedding_model.encode([text])
-        distances, indices = self.indexer.search(query_vector, dense_candidate_k)
+        query_vector = self.encode_query(text)
+        with self._index_lock:
+            dense_hits, sparse_hits = self._retrieve(query_vector, text, dense_candidate_k)
+            documents, doc_metadata = self.documents, self.doc_metadata
 
         dense_results = {}
 
-        for rank, idx in enumerate(indices[0]):
-            similarity = float(distances[0][rank])
+        for idx, similarity in dense_hits:
 
             dense_results[int(idx)] = {
                 "chunk_id": int(idx),
                 "dense_score": similarity,
-                "source": self.doc_metadata[idx]["source"],
-                "text": self.documents[idx]
+                "source": doc_metadata[idx]["source"],
+                "text": documents[idx]
             }
 
         # Sparse Retrieval--- BM25
         sparse_results = {}
-        if self.bm25 is not None:
-            tokenized_query = text.split()
-            scores = self.bm25.get_scores(tokenized_query)
-
-            top_sparse_indices = sorted(
-                range(len(scores)),
-                key=lambda i: scores[i],
-                reverse=True
-            )[:dense_candidate_k]
-
-            for idx in top_sparse_indices:
-                sparse_results[int(idx)] = scores[idx]
+        for idx, score in sparse_hits:
+            sparse_results[int(idx)] = score
 
         # Score Normalization 
         if dense_results:
@@ -113,8 +398,8 @@ class SemanticSearch:
                 "chunk_id": idx,
                 "similarity_score": round(dense_score, 4),
                 "final_score": round(final_score, 4),
-                "source": self.doc_metadata[idx]["source"],
-                "text": self.documents[idx]
+                "source": doc_metadata[idx]["source"],
+                "text": documents[idx]
             })
 
         # First stage Ranking (Hybrid) 
@@ -148,7 +433,7 @@ class SemanticSearch:
                 for candidate in top_candidates
             ]
 
-            rerank_scores = self.reranker.predict(query_chunk_pairs)
+            rerank_scores = self.rerank(query_chunk_pairs)
 
             for i, score in enumerate(rerank_scores):
                 top_candidates[i]["rerank_score"] = float(score)
@@ -170,38 +455,32 @@ class SemanticSearch:
         return hybrid_results[:top_k]
     
     def bm25_search(self, text, top_k=3):
-        if self.bm25 is None:
-            return []
-
-        tokenized_query = text.split()
-        scores = self.bm25.get_scores(tokenized_query)
-
-        ranked_indices = sorted(
-            range(len(scores)),
-            key=lambda i: scores[i],
-            reverse=True
-        )[:top_k]
+        with self._index_lock:
+            _, ranked = self._retrieve(None, text, top_k)
+            documents, doc_metadata = self.documents, self.doc_metadata
 
         results = []
 
-        for idx in ranked_indices:
+        for idx, score in ranked:
             results.append({
                 "chunk_id": int(idx),
-                "similarity_score": round(float(scores[idx]), 4),
-                "final_score": round(float(scores[idx]), 4),
-                "source": self.doc_metadata[idx]["source"],
-                "text": self.documents[idx]
+                "similarity_score": round(float(score), 4),
+                "final_score": round(float(score), 4),
+                "source": doc_metadata[idx]["source"],
+                "text": documents[idx]
             })
 
         return results
     
     def query_with_context(self, text, top_k=3):
-        query_vector = self.embedding_model.encode([text])
-        distances, indices = self.indexer.search(query_vector, top_k)
+        query_vector = self.encode_query(text)
+        with self._index_lock:
+            dense_hits, _ = self._retrieve(query_vector, None, top_k)
+            documents = self.documents
 
         retrieved_chunks = []
-        for idx in indices[0]:
-            retrieved_chunks.append(self.documents[idx])
+        for idx, _ in dense_hits:
+            retrieved_chunks.append(documents[idx])
 
         # Combine into context block
         context = "\n\n".join(retrieved_chunks)
@@ -259,34 +538,7 @@ User Question:
 Provide a concise, well-structured answer.
 """
 
-        if LLM_MODE == "local":
-
-            response = ollama.chat(
-                model="llama3",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                options={"temperature": 0}
-            )
-
-            answer = response["message"]["content"]
-           
-
-        elif LLM_MODE == "api":
-            
-            from groq import Groq
-
-            client = Groq(api_key=API_KEY)
-
-            response = client.chat.completions.create(
-                model=API_MODEL,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0
-            )
-
-            answer = response.choices[0].message.content
+        answer = self.llm_client.chat(prompt)
         
         import re
 
@@ -0,0 +1,229 @@
+import json
+import math
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class ChatSessionStore:
+    """
+    Server-side chat history keyed by session ID.
+
+    The Flask cookie only carries the session ID; messages live here.
+    - In-process LRU of recently active sessions
+    - Optional SQLite file (db_path) so history survives eviction and restarts,
+      and can be shared by several worker processes (e.g. gunicorn)
+    - Compaction: sources of turns older than keep_full_turns are dropped
+    """
+
+    def __init__(self, max_sessions=1000, db_path=None, keep_full_turns=10):
+        self.max_sessions = max_sessions
+        self.db_path = db_path
+        self.keep_full_turns = keep_full_turns
+
+        # session_id -> (last row id seen, [message]); row id is always 0 without SQLite
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if self.db_path:
+            # One connection shared across threads, every use is under self._lock.
+            # Autocommit mode, so writes can take the lock up front with BEGIN IMMEDIATE.
+            self._conn = sqlite3.connect(
+                self.db_path,
+                timeout=10,
+                check_same_thread=False,
+                isolation_level=None
+            )
+
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    UNIQUE (session_id, seq)
+                )
+            """)
+
+            # Keeps the per-session MAX(id) freshness check an index lookup
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS chat_messages_session_id ON chat_messages (session_id, id)"
+            )
+
+    def _last_row_id(self, session_id):
+        row = self._conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM chat_messages WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        return row[0]
+
+    def _load(self, session_id):
+        # Caller holds the lock
+        cached = self._cache.get(session_id)
+
+        if self.db_path:
+            # Other processes may have written since; ids only grow, so a changed
+            # max id means the cached copy is stale
+            last_id = self._last_row_id(session_id)
+
+            if cached is None or cached[0] != last_id:
+                rows = self._conn.execute(
+                    "SELECT payload FROM chat_messages WHERE session_id = ? ORDER BY seq",
+                    (session_id,)
+                ).fetchall()
+                cached = (last_id, [json.loads(row[0]) for row in rows])
+
+        elif cached is None:
+            cached = (0, [])
+
+        self._cache[session_id] = cached
+        self._cache.move_to_end(session_id)
+
+        # Evict least recently used (still on disk if SQLite is enabled)
+        while len(self._cache) > self.max_sessions:
+            self._cache.popitem(last=False)
+
+        return cached[1]
+
+    def get_history(self, session_id):
+        with self._lock:
+            return list(self._load(session_id))
+
+    def page(self, session_id, page=None, page_size=20):
+        """
+        Returns (messages, page, total_pages). Pages are counted from the newest
+        end: page 1 (the default) is the latest page_size messages, and only the
+        oldest page can be partial.
+        """
+        with self._lock:
+            cached = self._cache.get(session_id)
+
+            if self.db_path and (cached is None or cached[0] != self._last_row_id(session_id)):
+                # Not cached (or another process wrote): read just this page, so the
+                # cost of a page load doesn't grow with the conversation
+                return self._page_db(session_id, page, page_size)
+
+            messages = self._load(session_id)
+            start, end, page, total_pages = self._page_bounds(len(messages), page, page_size)
+            return list(messages[start:end]), page, total_pages
+
+    def _page_bounds(self, total, page, page_size):
+        total_pages = max(1, math.ceil(total / page_size))
+        page = min(max(1, page or 1), total_pages)
+
+        end = total - (page - 1) * page_size
+        start = max(0, end - page_size)
+        return start, end, page, total_pages
+
+    def _page_db(self, session_id, page, page_size):
+        # seqs are contiguous from 0, so MAX(seq) + 1 is the message count (an index lookup)
+        total = self._conn.execute(
+            "SELECT COALESCE(MAX(seq) + 1, 0) FROM chat_messages WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()[0]
+
+        start, end, page, total_pages = self._page_bounds(total, page, page_size)
+
+        rows = self._conn.execute(
+            "SELECT payload FROM chat_messages WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (session_id, start, end)
+        ).fetchall()
+
+        return [json.loads(row[0]) for row in rows], page, total_pages
+
+    def append(self, session_id, *new_messages):
+        with self._lock:
+            if self.db_path:
+                self._append_db(session_id, new_messages)
+                return
+
+            messages = self._load(session_id)
+            messages.extend(new_messages)
+            self._compact(messages, len(messages) - len(new_messages))
+
+    def _append_db(self, session_id, new_messages):
+        # The sequence number is taken inside the write transaction, so concurrent
+        # writers in other processes can't pick the same seq
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+
+        try:
+            previous_id = self._last_row_id(session_id)
+
+            start_seq = conn.execute(
+                "SELECT COALESCE(MAX(seq) + 1, 0) FROM chat_messages WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()[0]
+
+            conn.executemany(
+                "INSERT INTO chat_messages (session_id, seq, payload) VALUES (?, ?, ?)",
+                [
+                    (session_id, start_seq + i, json.dumps(message))
+                    for i, message in enumerate(new_messages)
+                ]
+            )
+
+            # Only the messages that just crossed the cutoff need compacting
+            total = start_seq + len(new_messages)
+            cutoff = total - self.keep_full_turns * 2
+            rows = conn.execute(
+                "SELECT seq, payload FROM chat_messages WHERE session_id = ? AND seq >= ? AND seq < ?",
+                (session_id, max(0, cutoff - len(new_messages)), max(0, cutoff))
+            ).fetchall()
+
+            updates = []
+            for seq, payload in rows:
+                message = json.loads(payload)
+                if message.get("sources"):
+                    updates.append((json.dumps(self._compacted(message)), session_id, seq))
+
+            conn.executemany(
+                "UPDATE chat_messages SET payload = ? WHERE session_id = ? AND seq = ?",
+                updates
+            )
+
+            last_id = self._last_row_id(session_id)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        # Update the cached copy in place when it was current before this write;
+        # otherwise another process wrote in between and it is re-read on demand
+        cached = self._cache.get(session_id)
+
+        # A brand-new session is cached from its first write
+        if cached is None and previous_id == 0:
+            cached = (0, [])
+
+        if cached is not None and cached[0] == previous_id:
+            messages = cached[1]
+            messages.extend(new_messages)
+            self._compact(messages, len(messages) - len(new_messages))
+            self._cache[session_id] = (last_id, messages)
+            self._cache.move_to_end(session_id)
+        else:
+            self._cache.pop(session_id, None)
+
+    def _compact(self, messages, first_new):
+        # A turn is one user + one assistant message; only the messages that
+        # just crossed the cutoff need compacting
+        cutoff = len(messages) - self.keep_full_turns * 2
+
+        for seq in range(max(0, cutoff - (len(messages) - first_new)), max(0, cutoff)):
+            if messages[seq].get("sources"):
+                messages[seq] = self._compacted(messages[seq])
+
+    def _compacted(self, message):
+        return {**message, "sources": [], "compacted": True}
+
+    def clear(self, session_id):
+        with self._lock:
+            self._cache.pop(session_id, None)
+
+            if self.db_path:
+                self._conn.execute(
+                    "DELETE FROM chat_messages WHERE session_id = ?",
+                    (session_id,)
+                )
@@ -0,0 +1,286 @@
+import atexit
+import collections
+import os
+import subprocess
+import sys
+import threading
+import zlib
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+from indexer import FaissIndexer
+
+
+AUTHKEY_ENV = "VECTORFORGE_SHARD_AUTHKEY"
+
+
+class IndexShard:
+    """
+    One partition of the corpus: its own FAISS index and BM25 model.
+
+    Chunks are identified by their global chunk_id, so results from every
+    shard can be merged directly by the coordinator.
+    """
+
+    def __init__(self, dimension):
+        self.reset(dimension)
+
+    def reset(self, dimension):
+        self.dimension = dimension
+        self.indexer = None
+        self.chunk_ids = []
+        self.tokenized_docs = []
+        self.bm25 = None
+
+    def add(self, chunk_ids, texts, embeddings):
+        if not chunk_ids:
+            return
+
+        self.chunk_ids.extend(chunk_ids)
+        self.tokenized_docs.extend(text.split() for text in texts)
+        self.bm25 = BM25Okapi(self.tokenized_docs)
+
+        # nlist=1 keeps dense search exact within the shard (each partition is
+        # small), matching the unsharded index the app starts with
+        if self.indexer is None:
+            self.indexer = FaissIndexer(self.dimension, nlist=1)
+
+        self.indexer.add(embeddings)
+
+    def remap(self, new_ids):
+        """Applies the coordinator's chunk_id renumbering; ids missing from new_ids are dropped."""
+        keep = [i for i, chunk_id in enumerate(self.chunk_ids) if chunk_id in new_ids]
+
+        chunk_ids = [new_ids[self.chunk_ids[i]] for i in keep]
+        tokenized_docs = [self.tokenized_docs[i] for i in keep]
+
+        # Rebuilt from the vectors read back out of this shard's FAISS index, nothing is re-encoded
+        embeddings = self.indexer.reconstruct_all()[keep] if self.indexer is not None else None
+
+        self.reset(self.dimension)
+        if chunk_ids:
+            self.chunk_ids = chunk_ids
+            self.tokenized_docs = tokenized_docs
+            self.bm25 = BM25Okapi(self.tokenized_docs)
+            self.indexer = FaissIndexer(self.dimension, nlist=1)
+            self.indexer.add(embeddings)
+
+    def search(self, query_vector, query_text, top_k):
+        dense = []
+
+        if query_vector is not None and self.indexer is not None:
+            distances, indices = self.indexer.search(query_vector, top_k)
+
+            for score, idx in zip(distances[0], indices[0]):
+                # FAISS pads with -1 when the shard holds fewer than top_k vectors
+                if idx >= 0:
+                    dense.append((self.chunk_ids[idx], float(score)))
+
+        sparse = []
+
+        if query_text is not None and self.bm25 is not None:
+            scores = self.bm25.get_scores(query_text.split())
+            top = np.argsort(scores)[::-1][:top_k]
+            sparse = [(self.chunk_ids[i], float(scores[i])) for i in top]
+
+        return dense, sparse
+
+    def total_vectors(self):
+        return self.indexer.total_vectors() if self.indexer is not None else 0
+
+
+class ShardClient:
+    """Parent-side handle to one shard worker process."""
+
+    def __init__(self, shard_id, dimension):
+        self.shard_id = shard_id
+        authkey = os.urandom(16)
+
+        # The worker binds its own port and reports it on stdout, so a crash at
+        # startup surfaces as an error here instead of a hung accept()
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), str(shard_id), str(dimension)],
+            stdout=subprocess.PIPE,
+            env={**os.environ, AUTHKEY_ENV: authkey.hex()},
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+
+        line = self.process.stdout.readline().decode().strip()
+        if not line:
+            raise RuntimeError(f"Shard {shard_id} worker failed to start")
+
+        self.conn = Client(("127.0.0.1", int(line)), authkey=authkey)
+
+        # The worker answers requests in order, so replies are matched FIFO
+        self._pending = collections.deque()
+        self._send_lock = threading.Lock()
+        self._reader = threading.Thread(
+            target=self._read_replies,
+            name=f"shard-{shard_id}-reader",
+            daemon=True
+        )
+        self._reader.start()
+
+    def call_async(self, method, **kwargs):
+        future = Future()
+
+        with self._send_lock:
+            self._pending.append(future)
+            try:
+                self.conn.send((method, kwargs))
+            except Exception:
+                # Nothing reached the worker (send pickles first), so no reply will
+                # come for this future; leaving it queued would shift every later reply
+                self._pending.pop()
+                raise
+
+        return future
+
+    def _read_replies(self):
+        while True:
+            try:
+                status, payload = self.conn.recv()
+            except (EOFError, OSError):
+                error = RuntimeError(f"Shard {self.shard_id} worker exited")
+                while self._pending:
+                    self._pending.popleft().set_exception(error)
+                return
+
+            future = self._pending.popleft()
+
+            if status == "ok":
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(f"Shard {self.shard_id}: {payload}"))
+
+    def close(self):
+        try:
+            with self._send_lock:
+                self.conn.send(("close", {}))
+            self.conn.close()
+        except OSError:
+            pass
+
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class ShardCoordinator:
+    """
+    Scatter-gather over shard worker processes.
+
+    Chunks are routed to a shard by source name or by content hash; queries
+    are sent to every shard at once and the per-shard top-k lists merged.
+    BM25 statistics are per shard, so sparse scores are comparable across
+    shards only approximately (fine for hash partitioning, rougher by source).
+    """
+
+    def __init__(self, num_shards, dimension, partition="source"):
+        if partition not in ("source", "hash"):
+            raise ValueError(f"Unknown shard partition: {partition}")
+
+        self.num_shards = num_shards
+        self.dimension = dimension
+        self.partition = partition
+
+        self.shards = [ShardClient(i, dimension) for i in range(num_shards)]
+        atexit.register(self.close)
+
+    def shard_for(self, text, source):
+        key = source if self.partition == "source" and source else text
+        return zlib.crc32(key.encode("utf-8")) % self.num_shards
+
+    def remap(self, new_ids):
+        self._gather([
+            shard.call_async("remap", new_ids=new_ids)
+            for shard in self.shards
+        ])
+
+    def add(self, chunk_ids, texts, sources, embeddings):
+        routed = collections.defaultdict(list)
+
+        for position, (text, source) in enumerate(zip(texts, sources)):
+            routed[self.shard_for(text, source)].append(position)
+
+        self._gather([
+            self.shards[shard_id].call_async(
+                "add",
+                chunk_ids=[chunk_ids[p] for p in positions],
+                texts=[texts[p] for p in positions],
+                embeddings=embeddings[positions]
+            )
+            for shard_id, positions in routed.items()
+        ])
+
+    def search(self, query_vector, query_text, top_k):
+        """Returns global (dense, sparse) top-k lists of (chunk_id, score)."""
+        replies = self._gather([
+            shard.call_async(
+                "search",
+                query_vector=query_vector,
+                query_text=query_text,
+                top_k=top_k
+            )
+            for shard in self.shards
+        ])
+
+        dense = []
+        sparse = []
+
+        for shard_dense, shard_sparse in replies:
+            dense.extend(shard_dense)
+            sparse.extend(shard_sparse)
+
+        dense = sorted(dense, key=lambda hit: hit[1], reverse=True)[:top_k]
+        sparse = sorted(sparse, key=lambda hit: hit[1], reverse=True)[:top_k]
+
+        return dense, sparse
+
+    def total_vectors(self):
+        return sum(self._gather([
+            shard.call_async("total_vectors")
+            for shard in self.shards
+        ]))
+
+    def _gather(self, futures):
+        return [future.result() for future in futures]
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+        self.shards = []
+
+
+def _serve(shard_id, dimension):
+    authkey = bytes.fromhex(os.environ[AUTHKEY_ENV])
+
+    with Listener(("127.0.0.1", 0), authkey=authkey) as listener:
+        # Tell the parent where to connect
+        print(listener.address[1], flush=True)
+        conn = listener.accept()
+
+    shard = IndexShard(dimension)
+
+    while True:
+        try:
+            method, kwargs = conn.recv()
+        except EOFError:
+            break
+
+        if method == "close":
+            break
+
+        try:
+            conn.send(("ok", getattr(shard, method)(**kwargs)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    _serve(int(sys.argv[1]), int(sys.argv[2]))